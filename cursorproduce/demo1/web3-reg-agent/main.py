@@ -1,162 +1,487 @@
 """
 本模块用于抓取香港证监会（SFC）和美国 SEC 的政策内容，进行基础清洗、结构化为 JSON，
 并可选地通过 Jina 向量接口做简单深度检索。
-运行前请确认已安装依赖：requests、beautifulsoup4。
+运行前请确认已安装依赖：aiohttp、aiohttp-client-cache、aiosqlite、requests、beautifulsoup4、lxml、numpy。
 如需启用 Jina 检索，请在环境变量中提供 JINA_API_KEY。
+可选安装 orjson 以加快 JSON 写入，可选安装 simsimd（pip install simsimd）以加快向量检索，
+可选安装 selectolax 以加快 HTML 解析（环境变量 HTML_BACKEND=bs4 可强制使用 BeautifulSoup）。
 """
 
+import asyncio  # 单线程事件循环并发抓取网页
+import heapq  # 只取前 top_k 条结果，避免全量排序
 import json  # 用于存储清洗后的政策数据为 JSON
 import os  # 用于读取环境变量（如 JINA_API_KEY）
-import re  # 用于简单的正则清洗文本和抽取日期
-from typing import Dict, List  # 类型注解，帮助初学者理解数据结构
-from urllib.parse import urljoin  # 把相对链接转成绝对链接，防止抓取失败
-
-import requests  # 发送 HTTP 请求抓取网页内容
-from bs4 import BeautifulSoup  # 解析 HTML 结构，提取需要的文本和链接
+import re  # 用于关键词匹配和抽取日期
+import time  # 记录各域名上次访问时间，控制抓取频率
+from collections import defaultdict  # 按域名懒创建锁
+from datetime import timedelta  # 设置 HTTP 缓存的过期时间
+from functools import lru_cache  # 缓存重复的 URL 解析结果
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple  # 类型注解，帮助初学者理解数据结构
+from urllib.parse import urljoin, urlparse  # 把相对链接转成绝对链接、解析域名
+
+import aiohttp  # 异步 HTTP 客户端，抓取网页
+import numpy as np  # 向量化计算余弦相似度，避免纯 Python 循环
+import requests  # 发送 HTTP 请求调用 Jina 接口
+from aiohttp_client_cache import CachedResponse, CachedSession, SQLiteBackend  # 把网页响应缓存到本地，重复运行时免去重复下载
+from bs4 import BeautifulSoup, SoupStrainer  # 解析 HTML 结构，提取需要的文本和链接
+from requests.adapters import HTTPAdapter  # 配置连接池大小与重试策略
+from urllib3.util.retry import Retry  # 对临时性错误自动退避重试
+
+try:
+    import orjson  # 可选依赖：C 实现的 JSON 序列化，比标准库快数倍
+except ImportError:  # 未安装时退回标准库 json
+    orjson = None
+
+try:
+    import simsimd  # 可选依赖：SIMD（AVX-512/NEON）加速的向量距离计算
+    _HAS_SIMSIMD = True
+except ImportError:  # 未安装时退回 NumPy 实现
+    _HAS_SIMSIMD = False
+
+try:
+    from selectolax.lexbor import LexborHTMLParser  # 可选依赖：基于 lexbor 的高速 HTML 解析器
+    _HAS_SELECTOLAX = True
+except ImportError:  # 未安装时退回 BeautifulSoup + lxml
+    _HAS_SELECTOLAX = False
 
 
 # ======================== 抓取相关模块 ======================== #
-def fetch_html(url: str, timeout: int = 10) -> str:
-    """抓取单个网页的 HTML。"""
-    headers = {"User-Agent": "Mozilla/5.0 (PolicyCrawler/1.0)"}  # 伪装浏览器头，减少被拦截概率
-    resp = requests.get(url, headers=headers, timeout=timeout)  # 发送 GET 请求
-    resp.raise_for_status()  # 如果状态码非 200，则抛出异常便于排查
-    return resp.text  # 返回 HTML 文本
-
-
-def extract_links_by_keywords(soup: BeautifulSoup, base_url: str, keywords: List[str]) -> List[Dict]:
-    """从页面中找出含关键词的链接（标题或 URL）。"""
-    results = []  # 存放符合条件的链接列表
+MAX_CONCURRENCY = 10  # 同时进行中的网页请求上限
+DOMAIN_DELAY = 1.5  # 同一域名两次请求之间的最小间隔（秒），保持礼貌抓取
+HEADERS = {"User-Agent": "Mozilla/5.0 (PolicyCrawler/1.0)"}  # 伪装浏览器头，减少被拦截概率
+
+ANCHOR_STRAINER = SoupStrainer("a", href=True)  # 入口页只需要链接，跳过 script/style 等节点的建树
+HTML_BACKEND = os.getenv("HTML_BACKEND", "lexbor")  # HTML 解析后端：lexbor（默认）或 bs4
+_USE_LEXBOR = HTML_BACKEND == "lexbor" and _HAS_SELECTOLAX  # 未安装 selectolax 时自动退回 bs4
+
+HTTP_CACHE_PATH = "output/http_cache.sqlite"  # HTTP 缓存文件位置
+HTTP_CACHE_EXPIRE = {  # 规则按顺序匹配，取第一个命中的
+    "*.sec.gov/news/press-release/*": timedelta(days=30),  # SEC 新闻稿永久链接基本不会变化，缓存更久
+    "*.sec.gov/newsroom/press-releases/*": timedelta(days=30),  # 新版新闻稿永久链接
+    "*.sec.gov/news/statement/*": timedelta(days=30),  # 公开声明永久链接
+    "*.sec.gov/newsroom/speeches-statements/*": timedelta(days=30),  # 新版公开声明永久链接
+    "*": timedelta(hours=6),  # 其它页面（含入口列表页）6 小时后重新抓取
+}
+
+
+def make_page_session() -> CachedSession:
+    """创建抓取网页用的异步会话：复用连接，并把成功的响应缓存到本地。"""
+    cache = SQLiteBackend(
+        HTTP_CACHE_PATH,
+        expire_after=timedelta(hours=6),  # 默认过期时间
+        urls_expire_after=HTTP_CACHE_EXPIRE,  # 按 URL 规则覆盖过期时间
+        allowed_codes=(200,),  # 只缓存成功的响应
+    )
+    return CachedSession(cache=cache, headers=HEADERS)  # 需在事件循环内创建并用 async with 关闭
+
+
+def make_session() -> requests.Session:
+    """创建调用 Jina 接口用的同步会话，复用 TCP/TLS 连接并统一设置请求头和重试策略。"""
+    session = requests.Session()  # 会话内部维护连接池，支持 keep-alive
+    retry = Retry(  # 临时错误退避重试
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"POST"}),  # 默认不重试 POST；嵌入请求是幂等的，可以安全重试
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=retry)  # 只有单线程调用 Jina 一个域名
+    session.mount("http://", adapter)  # HTTP 使用该适配器
+    session.mount("https://", adapter)  # HTTPS 使用该适配器
+    session.headers.update(HEADERS)  # 请求头只设置一次
+    return session  # 返回配置好的会话
+
+
+_SESSION = make_session()  # 模块级共享会话，复用连接
+
+
+@lru_cache(maxsize=4096)
+def _join(base: str, href: str) -> str:
+    """带缓存的 urljoin，导航栏等重复链接无需反复解析。"""
+    return urljoin(base, href)  # 将相对路径转为绝对 URL
+
+
+@lru_cache(maxsize=4096)
+def _netloc(url: str) -> str:
+    """带缓存的域名提取。"""
+    return urlparse(url).netloc  # 取出域名
+
+
+def make_throttle() -> Dict:
+    """创建单次抓取用的限流状态。asyncio 的锁和信号量会绑定首次使用它们的事件循环，所以每次运行都要新建。"""
+    return {
+        "semaphore": asyncio.Semaphore(MAX_CONCURRENCY),  # 限制总并发
+        "locks": defaultdict(asyncio.Lock),  # 每个域名一把锁
+        "last_hit": {},  # 每个域名上次发出请求的时间
+    }
+
+
+async def wait_for_domain(throttle: Dict, url: str) -> None:
+    """同一域名的请求按 DOMAIN_DELAY 间隔依次放行，不同域名之间互不影响。throttle 由 make_throttle 创建。"""
+    netloc = _netloc(url)  # 取出域名
+    async with throttle["locks"][netloc]:  # 同一域名排队等待
+        last = throttle["last_hit"].get(netloc, 0.0)  # 上次访问时间
+        await asyncio.sleep(max(0.0, DOMAIN_DELAY - (time.monotonic() - last)))  # 未到间隔则等待，不阻塞其它域名
+        throttle["last_hit"][netloc] = time.monotonic()  # 记录本次访问时间
+
+
+async def read_cached(session: CachedSession, url: str) -> Tuple[str, Optional[CachedResponse]]:
+    """直接读取缓存中的响应（包括已过期的），返回（缓存键, 响应），没有缓存时响应为 None。
+    注意：之后的 session.get 发现缓存过期会把它删除，回退使用时需要重新写回。"""
+    cache = session.cache  # 会话的缓存后端
+    key = cache.create_key("GET", url)  # 与会话发送 GET 请求时使用相同的缓存键
+    try:
+        redirect_key = await cache.redirects.read(key)  # 入口页可能经过重定向，缓存在目标地址的键下
+        return key, await cache.responses.read(redirect_key or key)  # 读取缓存的响应
+    except Exception:  # 缓存损坏或无法反序列化时视为没有缓存
+        return key, None  # 响应为 None
+
+
+async def fetch_html(session: CachedSession, throttle: Dict, url: str, timeout: int = 10) -> str:
+    """抓取单个网页的 HTML；网络出错时若有过期缓存则退回使用缓存内容。"""
+    key, cached = await read_cached(session, url)  # 先查看本地缓存
+    try:
+        async with throttle["semaphore"]:  # 控制总并发；先拿到名额再记录访问时间，避免同域名请求排队后一起发出
+            if cached is None or cached.is_expired:  # 只有未过期的缓存才不会访问网站，其余情况都要等待
+                await wait_for_domain(throttle, url)  # 遵守同域名访问间隔
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:  # 发送 GET 请求
+                resp.raise_for_status()  # 如果状态码非 200，则抛出异常便于排查
+                return await resp.text()  # 返回 HTML 文本
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:  # 网络异常或错误状态码
+        if cached is None:  # 没有可用的缓存
+            raise  # 交给调用方处理
+        print(f"[warn] 抓取失败，使用过期缓存 {url}: {e}")  # 打印警告
+        await session.cache.responses.write(key, cached)  # 过期缓存已被 session.get 删除，写回以便下次失败时仍可使用
+        return await cached.text()  # 返回过期的缓存内容
+
+
+def compile_keywords(keywords: List[str]) -> re.Pattern:
+    """把关键词列表编译成一个忽略大小写的正则，一次扫描即可匹配任一关键词。"""
+    return re.compile("|".join(re.escape(kw.lower()) for kw in keywords), re.IGNORECASE)  # 转义后用 | 连接
+
+
+KEYWORDS = ["web3", "virtual asset", "虚拟资产", "crypto", "stablecoin", "数字资产"]  # 关键词列表
+_KW_RE = compile_keywords(KEYWORDS)  # 模块加载时编译一次
+
+
+def iter_anchors(html: str) -> Iterator[Tuple[str, str]]:
+    """遍历页面上所有带 href 的超链接，依次产出（链接文字, href）。"""
+    if _USE_LEXBOR:  # 优先使用 lexbor 解析
+        for a in LexborHTMLParser(html).css("a[href]"):  # CSS 选择器直接定位超链接
+            yield a.text().strip(), a.attributes.get("href") or ""  # 链接文字去掉首尾空白
+        return  # 遍历完成
+    soup = BeautifulSoup(html, "lxml", parse_only=ANCHOR_STRAINER)  # 入口页只解析带 href 的 <a> 标签
     for a in soup.find_all("a"):  # 遍历页面上的所有超链接
-        title = (a.get_text() or "").strip()  # 获取链接文字并去掉首尾空白
-        href = a.get("href")  # 获取超链接地址
+        yield (a.get_text() or "").strip(), a.get("href") or ""  # 链接文字去掉首尾空白
+
+
+def page_text(html: str) -> str:
+    """提取详情页 body 中的可见文字（不含 script/style/noscript），片段之间用空格分隔；两种后端结果一致。"""
+    if _USE_LEXBOR:  # 优先使用 lexbor 解析
+        tree = LexborHTMLParser(html)  # 解析详情页
+        tree.strip_tags(["script", "style", "noscript"])  # 去掉不可见的脚本与样式内容
+        if tree.body is None:  # 没有 body 时没有正文
+            return ""  # 返回空字符串
+        return tree.body.text(separator=" ")  # 片段之间插入空格，避免单词粘连
+    page_soup = BeautifulSoup(html, "lxml")  # 用 C 实现的 lxml 解析详情页
+    for tag in page_soup(["script", "style", "noscript"]):  # 与 lexbor 分支去掉相同的标签
+        tag.decompose()  # 删除节点
+    if page_soup.body is None:  # 与 lexbor 分支一样只取 body，没有 body 时没有正文
+        return ""  # 返回空字符串
+    return " ".join(page_soup.body.stripped_strings)  # 直接拼接去掉首尾空白的文本片段
+
+
+def extract_links_by_keywords(anchors: Iterator[Tuple[str, str]], base_url: str, kw_re: re.Pattern) -> List[Dict]:
+    """从 iter_anchors 产出的链接中找出含关键词的（标题或 URL），kw_re 由 compile_keywords 生成。"""
+    results = []  # 存放符合条件的链接列表
+    for title, href in anchors:  # 遍历页面上的所有超链接
         if not href:  # 若没有链接则跳过
             continue  # 继续下一个循环
-        full_url = urljoin(base_url, href)  # 将相对路径转为绝对 URL
-        text_to_check = f"{title} {full_url}".lower()  # 将标题和 URL 合并转小写，便于关键词匹配
-        if any(kw.lower() in text_to_check for kw in keywords):  # 如果包含任一关键词
-            results.append({"title": title, "url": full_url})  # 加入结果列表
+        if not (kw_re.search(title) or kw_re.search(href)):  # 先用标题和原始 href 过滤，绝大多数链接在此跳过
+            continue  # 不含关键词则不必拼接完整 URL
+        full_url = _join(base_url, href)  # 只为命中的链接把相对路径转为绝对 URL
+        results.append({"title": title, "url": full_url})  # 加入结果列表
     return results  # 返回筛选出的链接
 
 
-def fetch_and_extract(base_url: str, entry_paths: List[str], keywords: List[str]) -> List[Dict]:
-    """从入口页开始抓取，找到包含关键词的链接并拉取其正文。"""
-    records = []  # 存储每条政策记录
-    for path in entry_paths:  # 遍历入口路径
-        entry_url = urljoin(base_url, path)  # 组合入口完整 URL
+def parse_entry_links(html: str, base_url: str, kw_re: re.Pattern) -> List[Dict]:
+    """解析入口页并按关键词过滤链接，在线程池中执行以免阻塞事件循环。"""
+    return extract_links_by_keywords(iter_anchors(html), base_url, kw_re)  # 按关键词过滤链接
+
+
+async def fetch_detail(session: CachedSession, throttle: Dict, link: Dict, source: str) -> Optional[Dict]:
+    """抓取并解析一个详情页，失败时打印警告并返回 None。"""
+    loop = asyncio.get_running_loop()  # 当前事件循环
+    try:
+        page_html = await fetch_html(session, throttle, link["url"])  # 抓取链接对应页面
+        return await loop.run_in_executor(None, build_record, link, page_html, source)  # 解析放到线程池，与其它页面的下载重叠
+    except Exception as e:  # 捕获异常
+        print(f"[warn] 抓取详情页失败 {link['url']}: {e}")  # 打印警告
+        return None  # 跳过该链接
+
+
+async def fetch_and_extract(
+    session: CachedSession, throttle: Dict, base_url: str, entry_paths: List[str], kw_re: re.Pattern
+) -> AsyncIterator[Dict]:
+    """从入口页开始抓取，找到包含关键词的链接并并发拉取其正文，按链接出现的顺序逐条产出记录。"""
+    loop = asyncio.get_running_loop()  # 当前事件循环
+    tasks = []  # 详情页抓取任务
+    seen_urls = set()  # 已提交抓取的详情页（规范化后），避免多个入口重复抓取同一页面
+    entry_urls = dict.fromkeys(urljoin(base_url, path) for path in entry_paths)  # 组合入口完整 URL，并按顺序去重
+    for entry_url in entry_urls:  # 遍历入口页
         try:
-            html = fetch_html(entry_url)  # 抓取入口页 HTML
+            html = await fetch_html(session, throttle, entry_url)  # 抓取入口页 HTML
         except Exception as e:  # 捕获网络异常避免程序中断
             print(f"[warn] 抓取入口页失败 {entry_url}: {e}")  # 打印警告
             continue  # 继续处理下一个入口
-        soup = BeautifulSoup(html, "html.parser")  # 解析入口页 HTML
-        links = extract_links_by_keywords(soup, base_url, keywords)  # 按关键词过滤链接
+        links = await loop.run_in_executor(None, parse_entry_links, html, base_url, kw_re)  # 在线程池中解析入口页
         for link in links:  # 遍历符合条件的链接
-            try:
-                page_html = fetch_html(link["url"])  # 抓取链接对应页面
-            except Exception as e:  # 捕获异常
-                print(f"[warn] 抓取详情页失败 {link['url']}: {e}")  # 打印警告
-                continue  # 跳过该链接
-            page_soup = BeautifulSoup(page_html, "html.parser")  # 解析详情页
-            text = page_soup.get_text(separator="\n")  # 把页面所有可见文字拼成一段文本
-            cleaned = clean_text(text)  # 调用清洗函数去掉噪声
-            records.append(  # 追加到记录列表
-                {
-                    "title": link["title"],
-                    "url": link["url"],
-                    "source": base_url,
-                    "raw_text": text,
-                    "clean_text": cleaned,
-                    "date": extract_date(cleaned),
-                }
-            )
-    return records  # 返回抓取的记录
+            norm = normalize_url(link["url"])  # 去掉锚点和末尾斜杠
+            if norm in seen_urls:  # 已经抓取过则跳过
+                continue  # 继续下一个链接
+            seen_urls.add(norm)  # 记录为已抓取
+            tasks.append(asyncio.ensure_future(fetch_detail(session, throttle, link, base_url)))  # 立即开始抓取，与后续入口页重叠
+    for task in tasks:  # 按提交顺序取结果，输出顺序固定；其余任务仍在后台并发执行
+        record = await task  # 取回解析好的记录
+        if record is not None:  # 失败的详情页已打印警告
+            yield record  # 逐条产出，不在内存中累积全部记录
+
+
+async def merge_records(*sources: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+    """并发消费多个记录流，按参数顺序转发：先转发完第一个站点的记录，再转发下一个站点的。"""
+    queues: List[asyncio.Queue] = [asyncio.Queue() for _ in sources]  # 每个站点一个队列，后面的站点先在队列里缓冲
+    finished = object()  # 单个记录流结束的标记
+
+    async def drain(source: AsyncIterator[Dict], queue: asyncio.Queue) -> None:
+        try:
+            async for record in source:  # 逐条读取该站点的记录
+                await queue.put(record)  # 放入该站点的队列
+        finally:
+            await queue.put(finished)  # 无论成功与否都通知该流结束
+
+    tasks = [asyncio.ensure_future(drain(source, queue)) for source, queue in zip(sources, queues)]  # 各站点同时抓取
+    for queue in queues:  # 按站点顺序依次转发
+        while True:  # 直到该站点的记录流结束
+            item = await queue.get()  # 取出下一条
+            if item is finished:  # 该记录流结束
+                break  # 转发下一个站点
+            yield item  # 转发记录
+    await asyncio.gather(*tasks)  # 抛出各任务中未处理的异常
+
+
+def normalize_url(url: str) -> str:
+    """规范化 URL 用于去重：去掉 # 锚点和末尾的斜杠。"""
+    return url.split("#")[0].rstrip("/")  # 返回规范化后的 URL
+
+
+def build_record(link: Dict, page_html: str, source: str) -> Dict:
+    """解析详情页 HTML，组装成一条政策记录。"""
+    cleaned = clean_text(page_text(page_html))  # 提取可见文字并合并多余空白
+    return {
+        "title": link["title"],
+        "url": link["url"],
+        "source": source,
+        "clean_text": cleaned,
+        "date": extract_date(cleaned),
+    }
 
 
 # ======================== 文本清洗与结构化模块 ======================== #
 def clean_text(text: str) -> str:
     """基础清洗：移除多余空白和重复换行。"""
-    text = re.sub(r"\s+", " ", text)  # 用一个空格替换多余空白
-    text = text.strip()  # 去掉首尾空白
-    return text  # 返回清洗后的文本
+    return " ".join(text.split())  # 按任意空白切分并丢弃空串，再用单个空格拼接，等价于正则替换加 strip
+
+
+_DATE_RE = re.compile(r"\d{4}[-/]\d{2}[-/]\d{2}")  # 常见日期格式，模块加载时编译一次
 
 
 def extract_date(text: str) -> str:
     """简单提取日期（格式 YYYY-MM-DD 或 YYYY/MM/DD），找不到则返回空字符串。"""
-    m = re.search(r"\d{4}[-/]\d{2}[-/]\d{2}", text)  # 使用正则匹配常见日期格式
+    m = _DATE_RE.search(text)  # 使用预编译正则匹配常见日期格式
     return m.group(0) if m else ""  # 找到则返回日期，否则返回空字符串
 
 
-def save_json(data: List[Dict], path: str) -> None:
-    """把抓取结果保存为 JSON 文件。"""
-    with open(path, "w", encoding="utf-8") as f:  # 以 UTF-8 编码写文件
-        json.dump(data, f, ensure_ascii=False, indent=2)  # 写入并保持中文
+def dump_record(rec: Dict) -> bytes:
+    """把单条记录序列化为 UTF-8 JSON 字节。"""
+    if orjson is not None:  # 优先使用 orjson，直接生成 UTF-8 字节
+        return orjson.dumps(rec, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)  # 保持中文
+    return json.dumps(rec, ensure_ascii=False, indent=2).encode("utf-8")  # 退回标准库，保持中文
+
+
+async def save_json(records: AsyncIterator[Dict], path: str) -> int:
+    """边抓取边把记录逐条写入 JSON 数组文件，返回写入的记录数。
+    先写入临时文件，全部成功后再替换目标文件，中途出错不会留下不完整的 JSON。"""
+    count = 0  # 已写入的记录数
+    tmp_path = path + ".tmp"  # 同目录下的临时文件，保证 os.replace 是原子操作
+    try:
+        with open(tmp_path, "wb") as f:  # 以二进制方式写文件
+            f.write(b"[\n")  # 数组开头
+            async for rec in records:  # 记录到达一条写一条
+                if count:  # 第二条起先写分隔符
+                    f.write(b",\n")  # 记录之间的逗号
+                f.write(dump_record(rec))  # 写入当前记录
+                count += 1  # 计数加一
+            f.write(b"\n]\n")  # 数组结尾
+        os.replace(tmp_path, path)  # 写完后一次性替换目标文件
+    except BaseException:  # 包括 Ctrl+C 与任务取消
+        if os.path.exists(tmp_path):  # 清理写了一半的临时文件
+            os.remove(tmp_path)  # 删除临时文件
+        raise  # 继续抛出原异常
+    return count  # 返回写入条数
+
+
+def load_json(path: str) -> List[Dict]:
+    """从 JSON 文件读回全部记录，并为每条记录缓存一份小写正文（_clean_lower）供关键词检索复用。"""
+    with open(path, "rb") as f:  # 以二进制方式读文件
+        data = f.read()  # 读取全部内容
+    records = orjson.loads(data) if orjson is not None else json.loads(data)  # 优先使用 orjson 解析
+    for rec in records:  # 载入时小写一次，之后多次查询无需重复转换
+        rec["_clean_lower"] = rec.get("clean_text", "").lower()  # 缓存小写正文
+    return records  # 返回记录列表
 
 
 # ======================== Jina 深度检索模块 ======================== #
 JINA_API_URL = "https://api.jina.ai/v1/embeddings"  # 官方 Jina 嵌入 API 地址
+JINA_BATCH_SIZE = 64  # 每次请求携带的文本条数，减少 HTTP 往返次数
+JINA_TIMEOUT_BASE = 15  # 单条文本请求的超时（秒）
+JINA_TIMEOUT_PER_TEXT = 1  # 每多一条文本增加的超时（秒），整页正文的批量请求需要更长时间
+PAYLOAD_ERROR_STATUSES = {400, 413, 422}  # 由请求内容引起的错误状态码，拆分批次后可能成功
+AUTH_ERROR_STATUSES = {401, 403}  # 密钥无效或无权限，后续批次同样会失败
 
 
-def embed_with_jina(text: str, jina_api_key: str) -> List[float]:
-    """调用 Jina 嵌入接口获取向量。"""
-    payload = {"input": text, "model": "jina-embeddings-v2-base-en"}  # 指定模型与输入
+def embed_with_jina(texts: List[str], jina_api_key: str) -> List[List[float]]:
+    """调用 Jina 嵌入接口批量获取向量，返回顺序与 texts 一致。"""
+    payload = {"input": texts, "model": "jina-embeddings-v2-base-en"}  # 指定模型与输入列表
     headers = {"Authorization": f"Bearer {jina_api_key}"}  # 在请求头里放入密钥
-    resp = requests.post(JINA_API_URL, headers=headers, json=payload, timeout=15)  # 发送 POST 请求
+    timeout = JINA_TIMEOUT_BASE + JINA_TIMEOUT_PER_TEXT * len(texts)  # 超时随批次大小增长
+    resp = _SESSION.post(JINA_API_URL, headers=headers, json=payload, timeout=timeout)  # 通过共享会话发送 POST 请求
     resp.raise_for_status()  # 如果失败抛异常便于排查
     data = resp.json()  # 解析返回 JSON
-    return data["data"][0]["embedding"]  # 提取向量数组
-
-
-def cosine_similarity(vec_a: List[float], vec_b: List[float]) -> float:
-    """手工计算余弦相似度。"""
-    if not vec_a or not vec_b:  # 若任意向量为空，返回 0
-        return 0.0  # 返回 0 表示无相似度
-    dot = sum(a * b for a, b in zip(vec_a, vec_b))  # 计算点积
-    norm_a = sum(a * a for a in vec_a) ** 0.5  # 计算向量 A 的模
-    norm_b = sum(b * b for b in vec_b) ** 0.5  # 计算向量 B 的模
-    if norm_a == 0 or norm_b == 0:  # 防止除零
-        return 0.0  # 若任一模长为 0，返回 0
-    return dot / (norm_a * norm_b)  # 返回余弦相似度
-
-
-def build_embeddings(records: List[Dict], jina_api_key: str) -> None:
-    """为每条记录生成并存储向量，原地更新 records。"""
-    for rec in records:  # 遍历每条记录
+    items = sorted(data["data"], key=lambda d: d.get("index", 0))  # 按 index 还原输入顺序
+    return [d["embedding"] for d in items]  # 提取向量数组列表
+
+
+def embed_batch_safely(texts: List[str], urls: List[str], jina_api_key: str) -> List[List[float]]:
+    """批量生成向量；整批因内容被拒时二分重试，定位并跳过出错的单条文本。
+    鉴权、限流、网络等与内容无关的错误拆分后也不会成功，直接抛出给 build_embeddings 处理。"""
+    try:
+        return embed_with_jina(texts, jina_api_key)  # 先尝试整批请求
+    except requests.HTTPError as e:  # 只处理 HTTP 错误状态码
+        status = e.response.status_code if e.response is not None else None  # 取出状态码
+        if status not in PAYLOAD_ERROR_STATUSES:  # 不是内容问题（如 401、5xx）
+            raise  # 交给调用方处理
+        if len(texts) == 1:  # 已缩小到单条，说明就是这条文本出错
+            print(f"[warn] Jina 向量生成失败 {urls[0]}: {e}")  # 打印警告
+            return [[]]  # 失败则留空，便于后续判断
+    mid = len(texts) // 2  # 对半拆分
+    left = embed_batch_safely(texts[:mid], urls[:mid], jina_api_key)  # 重试前半批
+    right = embed_batch_safely(texts[mid:], urls[mid:], jina_api_key)  # 重试后半批
+    return left + right  # 合并结果，保持原有顺序
+
+
+def stack_embeddings(vectors: List[List[float]]) -> np.ndarray:
+    """把向量列表堆叠成 (N, D) 的 float32 连续矩阵，生成失败的向量补零行。"""
+    dim = max((len(vec) for vec in vectors), default=0)  # 以最长向量确定维度
+    matrix = np.zeros((len(vectors), dim), dtype=np.float32)  # 预分配连续内存
+    for i, vec in enumerate(vectors):  # 逐条填入向量
+        if len(vec) == dim:  # 只有维度一致的向量才写入，失败的保持零行
+            matrix[i] = vec  # 写入矩阵对应行
+    return matrix  # 返回向量矩阵
+
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """按行对称量化为 int8：每行缩放系数为 max(|v|) / 127，返回 int8 矩阵与 (N,) 的缩放系数。"""
+    scales = np.abs(matrix).max(axis=1, initial=0.0) / 127.0  # 每行各自的缩放系数
+    safe = np.where(scales > 0, scales, 1.0)  # 零向量行避免除零
+    quantized = np.round(matrix / safe[:, None]).astype(np.int8)  # 量化到 [-127, 127]
+    return quantized, scales.astype(np.float32)  # 返回量化矩阵与缩放系数
+
+
+def build_embeddings(records: List[Dict], jina_api_key: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """为每条记录生成向量，返回 int8 量化矩阵、每行缩放系数，以及量化前计算好的模长。"""
+    vectors = []  # 与 records 一一对应的向量
+    for start in range(0, len(records), JINA_BATCH_SIZE):  # 按批次切分记录
+        batch = records[start : start + JINA_BATCH_SIZE]  # 当前批次
+        texts = [rec["clean_text"] for rec in batch]  # 批量文本
+        urls = [rec.get("url", "") for rec in batch]  # 用于出错时定位记录
         try:
-            rec["embedding"] = embed_with_jina(rec["clean_text"], jina_api_key)  # 生成并保存向量
-        except Exception as e:  # 捕获异常
-            print(f"[warn] Jina 向量生成失败 {rec.get('url')}: {e}")  # 打印警告
-            rec["embedding"] = []  # 失败则留空，便于后续判断
-
-
-def search_with_jina(records: List[Dict], query: str, jina_api_key: str, top_k: int = 5) -> List[Dict]:
-    """对抓取结果做向量检索，返回相似度最高的记录。"""
-    query_vec = embed_with_jina(query, jina_api_key)  # 为查询生成向量
-    scored = []  # 存放打分结果
-    for rec in records:  # 遍历记录
-        sim = cosine_similarity(query_vec, rec.get("embedding", []))  # 计算相似度
-        scored.append({**rec, "score": sim})  # 记录相似度分数
-    scored.sort(key=lambda x: x["score"], reverse=True)  # 按分数从高到低排序
-    return scored[:top_k]  # 返回前 top_k 条
+            vectors.extend(embed_batch_safely(texts, urls, jina_api_key))  # 一次请求生成整批向量
+        except Exception as e:  # 超时、连接失败、重试耗尽等错误只影响本批
+            response = getattr(e, "response", None)  # requests 异常可能带有响应
+            if response is not None and response.status_code in AUTH_ERROR_STATUSES:  # 密钥无效，后续批次同样会失败
+                print(f"[warn] Jina 鉴权失败，剩余 {len(records) - start} 条记录未生成向量: {e}")  # 打印警告
+                break  # 不再继续请求
+            print(f"[warn] Jina 批次向量生成失败，本批 {len(batch)} 条记录留空: {e}")  # 打印警告
+            vectors.extend([] for _ in batch)  # 本批补空向量，继续下一批
+    vectors.extend([] for _ in range(len(records) - len(vectors)))  # 未生成的记录补空向量，保持与 records 对齐
+    matrix = stack_embeddings(vectors)  # 一次性堆叠成 float32 矩阵
+    norms = np.linalg.norm(matrix, axis=1)  # 向量生成后不再变化，模长只需计算一次
+    quantized, scales = quantize_int8(matrix)  # 量化后内存降为 float32 的 1/4
+    return quantized, scales, norms  # 返回量化矩阵、缩放系数与形状为 (N,) 的模长数组
+
+
+def save_embeddings(quantized: np.ndarray, scales: np.ndarray, out_dir: str = "output") -> None:
+    """把 int8 向量及缩放系数另存为 .npy 文件，不混入面向用户的 JSON。"""
+    np.save(os.path.join(out_dir, "embeddings.npy"), quantized)  # 保存 int8 矩阵
+    np.save(os.path.join(out_dir, "embedding_scales.npy"), scales)  # 保存缩放系数，用于还原近似向量
+
+
+SCORE_BLOCK_ROWS = 4096  # NumPy 路径每次转换为 float32 的行数，限制临时内存
+
+
+def cosine_int8(
+    quantized: np.ndarray, scales: np.ndarray, norms: np.ndarray, q: np.ndarray
+) -> np.ndarray:
+    """在 int8 量化向量上计算余弦相似度：点积还原尺度后除以预先计算的模长。"""
+    if _HAS_SIMSIMD:  # 余弦与每行缩放无关，可直接在 int8 向量上用 SIMD 计算
+        q_i8, _ = quantize_int8(q[None, :])  # 查询向量同样量化
+        return 1.0 - np.asarray(simsimd.cdist(q_i8, quantized, metric="cosine"))[0]  # 距离转相似度
+    q_norm = float(np.linalg.norm(q))  # 查询向量的模长只算一次
+    dots = np.empty(len(quantized), dtype=np.float32)  # 每行与查询向量的点积
+    for start in range(0, len(quantized), SCORE_BLOCK_ROWS):  # 分块转换，避免整份矩阵的浮点副本
+        block = quantized[start : start + SCORE_BLOCK_ROWS].astype(np.float32)  # 当前块转为 float32
+        dots[start : start + len(block)] = block @ q  # float32 矩阵乘法走 BLAS
+    return dots * scales / (norms * q_norm + 1e-12)  # 还原尺度得到余弦相似度
+
+
+def search_with_jina(
+    records: List[Dict],
+    quantized: np.ndarray,
+    scales: np.ndarray,
+    norms: np.ndarray,
+    query: str,
+    jina_api_key: str,
+    top_k: int = 5,
+) -> List[Dict]:
+    """对抓取结果做向量检索，返回相似度最高的记录。quantized、scales、norms 为 build_embeddings 的返回值。"""
+    k = min(top_k, len(records))  # top_k 不能超过记录总数
+    if k <= 0:  # 没有记录或 top_k 非正时直接返回
+        return []  # 返回空列表
+    q = np.asarray(embed_with_jina([query], jina_api_key)[0], dtype=np.float32)  # 为查询生成向量
+    if quantized.shape[1] != q.shape[0]:  # 维度不一致（如全部向量生成失败）时相似度全为 0
+        sims = np.zeros(len(records), dtype=np.float32)  # 全零得分
+    else:
+        sims = cosine_int8(quantized, scales, norms, q)  # 复用缓存的模长与量化向量
+    idx = np.argpartition(-sims, k - 1)[:k]  # 只做部分排序，取出前 k 个下标
+    idx = idx[np.argsort(-sims[idx])]  # 仅对这 k 个结果排序
+    return [{**records[i], "score": float(sims[i])} for i in idx]  # 附上分数后返回
 
 
 def keyword_fallback(records: List[Dict], query: str, top_k: int = 5) -> List[Dict]:
     """如果没有 Jina 密钥，则用简单关键词匹配作为兜底。"""
-    q = query.lower()  # 把查询转成小写
-    scored = []  # 存放打分结果
+    tokens = query.lower().split()  # 把查询转成小写并按空白拆成多个关键词
+    scores = []  # 存放每条记录的得分
     for rec in records:  # 遍历记录
-        text = rec.get("clean_text", "").lower()  # 取出清洗文本并转小写
-        score = text.count(q)  # 简单统计关键词出现次数作为得分
-        scored.append({**rec, "score": score})  # 保存得分
-    scored.sort(key=lambda x: x["score"], reverse=True)  # 按分数排序
-    return scored[:top_k]  # 返回前 top_k 条
+        text = rec.get("_clean_lower")  # 优先使用载入时缓存的小写文本
+        if text is None:  # 兼容不是由 load_json 读入的记录
+            text = rec.get("clean_text", "").lower()  # 临时转小写
+        scores.append(sum(text.count(tok) for tok in tokens))  # 各关键词出现次数之和作为得分
+    top_idx = heapq.nlargest(top_k, range(len(records)), key=scores.__getitem__)  # 只取得分最高的 top_k 个下标
+    return [{**records[i], "score": scores[i]} for i in top_idx]  # 仅为入选记录附上分数
 
 
 # ======================== 主流程控制模块 ======================== #
-def main():
+async def main_async():
     """统一 orchestrator：抓取、清洗、保存并检索。"""
-    keywords = ["web3", "virtual asset", "虚拟资产", "crypto", "stablecoin", "数字资产"]  # 关键词列表
-
     # 定义 SFC 与 SEC 入口路径，方便日后扩展
     sfc_base = "https://www.sfc.hk"  # SFC 主域
     sfc_entries = ["/en/News-and-announcements/Policy-statements", "/en/News-and-announcements/Announcements"]  # 常见政策和公告入口
@@ -164,29 +489,30 @@ def main():
     sec_base = "https://www.sec.gov"  # SEC 主域
     sec_entries = ["/news/pressreleases", "/news/public-statements"]  # 常见新闻稿和公开声明入口
 
-    # 抓取两个站点的政策
-    print("[info] 开始抓取 SFC ...")  # 打印进度
-    sfc_records = fetch_and_extract(sfc_base, sfc_entries, keywords)  # 抓取 SFC
-
-    print("[info] 开始抓取 SEC ...")  # 打印进度
-    sec_records = fetch_and_extract(sec_base, sec_entries, keywords)  # 抓取 SEC
-
-    # 合并所有记录
-    all_records = sfc_records + sec_records  # 将两处数据合并
-    print(f"[info] 共获取 {len(all_records)} 条候选记录")  # 打印总数
-
-    # 保存清洗结果
+    # 同时抓取两个站点的政策，不同域名之间互不等待；记录边抓取边写入文件
+    print("[info] 开始抓取 SFC 与 SEC ...")  # 打印进度
     os.makedirs("output", exist_ok=True)  # 确保 output 目录存在
-    save_json(all_records, "output/policies.json")  # 保存 JSON
-    print("[info] 已写入 output/policies.json")  # 提示写入完成
-
-    # 检索示例（可选）
+    throttle = make_throttle()  # 本次运行的并发与访问间隔控制
+    async with make_page_session() as session:  # 整个抓取过程共享一个会话
+        records = merge_records(
+            fetch_and_extract(session, throttle, sfc_base, sfc_entries, _KW_RE),  # 抓取 SFC
+            fetch_and_extract(session, throttle, sec_base, sec_entries, _KW_RE),  # 抓取 SEC
+        )
+        count = await save_json(records, "output/policies.json")  # 流式保存 JSON
+    print(f"[info] 共获取 {count} 条候选记录，已写入 output/policies.json")  # 打印总数并提示写入完成
+
+    # 检索示例（可选）：只有需要检索时才把记录整体读回内存
+    query = os.getenv("POLICY_QUERY", "禁止 稳定币")  # 示例查询关键词，可通过环境变量修改，设为空则跳过检索
+    if not query.strip():  # 未指定查询
+        print("[info] POLICY_QUERY 为空，跳过检索")  # 打印提示
+        return  # 结束流程
+    all_records = load_json("output/policies.json")  # 读回全部记录
     jina_api_key = os.getenv("JINA_API_KEY", "")  # 从环境变量读取 Jina 密钥
-    query = "禁止 稳定币"  # 示例查询关键词，可按需修改
     if jina_api_key:  # 如果提供了密钥
         print("[info] 检测到 JINA_API_KEY，使用 Jina 深度检索")  # 打印提示
-        build_embeddings(all_records, jina_api_key)  # 为每条记录生成向量
-        top_hits = search_with_jina(all_records, query, jina_api_key, top_k=5)  # 做向量检索
+        quantized, scales, norms = build_embeddings(all_records, jina_api_key)  # 为每条记录生成量化向量
+        save_embeddings(quantized, scales)  # 向量单独存为 .npy，不写入 policies.json
+        top_hits = search_with_jina(all_records, quantized, scales, norms, query, jina_api_key, top_k=5)  # 做向量检索
     else:
         print("[info] 未检测到 JINA_API_KEY，使用关键词匹配兜底检索")  # 打印提示
         top_hits = keyword_fallback(all_records, query, top_k=5)  # 使用兜底检索
@@ -197,5 +523,10 @@ def main():
         print(f"- {item.get('title')} | {item.get('url')} | score={item.get('score', 0):.4f}")  # 打印标题、链接与得分
 
 
+def main():
+    """脚本入口：在事件循环中运行整个流程。"""
+    asyncio.run(main_async())  # 启动事件循环
+
+
 if __name__ == "__main__":  # 确保作为脚本运行时才执行 main
     main()  # 运行主流程